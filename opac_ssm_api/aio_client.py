@@ -0,0 +1,497 @@
+# coding: utf-8
+import asyncio
+import logging
+import itertools
+
+import grpc
+import requests
+from grpc import aio
+
+from opac_ssm_api import client
+from opac_ssm_api.client import (
+    HOST_NAME, HOST_PORT, HTTP_PROTO_PORT, PROTO_PATH, PROTO_UPDATE, ASSET_CHUNK_SIZE,
+    CHANNEL_OPTIONS, CHANNEL_POOL_SIZE, HTTP_UPLOAD_THRESHOLD, AssetView)
+
+logger = logging.getLogger(__name__)
+
+
+async def _asset_chunks(fp, asset):
+    """
+    Generate the messages of a streaming upload, as ``client._asset_chunks``.
+
+    The chunks are read in the default executor, so the reads dont block the
+    event loop.
+    """
+    loop = asyncio.get_running_loop()
+
+    yield client.opac_pb2.AssetChunk(metadata=asset)
+
+    while True:
+        data = await loop.run_in_executor(None, fp.read, ASSET_CHUNK_SIZE)
+        if not data:
+            break
+        yield client.opac_pb2.AssetChunk(chunk=data)
+
+
+class AsyncClient(object):
+    """
+    Asyncio client of the SSM, built on ``grpc.aio``.
+
+    It has the same methods of ``opac_ssm_api.client.Client``, as coroutines.
+
+    The channels of an asyncio client are bound to the running event loop, so
+    they are not shared between clients: create the client once and close it
+    with ``await cli.close()`` or use it as an async context manager:
+
+        async with AsyncClient() as cli:
+            await cli.get_asset(_id)
+    """
+
+    def __init__(self, host=HOST_NAME, port=HOST_PORT, proto_http_port=HTTP_PROTO_PORT,
+                 proto_path=PROTO_PATH, update_pb_class=PROTO_UPDATE, pool_size=CHANNEL_POOL_SIZE):
+        """
+        Initialize channel and stub objects.
+
+        Params:
+            :param: host: string, default='localhost'
+            :param: port: string, default='5000' (default of the SSM server service)
+            :param: proto_http_port: string, default='8001' (default of the HTTP server)
+            :param: proto_path: string, default='/static/proto/opac.proto' (default path to proto file)
+            :param: pool_size: number of channels, default=4
+        """
+        if update_pb_class:
+            client._update_pb_files(host, proto_http_port, proto_path)
+
+        client._lazy_import()
+
+        target = '{0}:{1}'.format(host, port)
+
+        self._pool = [
+            aio.insecure_channel(target, CHANNEL_OPTIONS + [('grpc.channel_arg_pool_id', pool_id)])
+            for pool_id in range(pool_size)]
+        self._asset_stubs = [client.opac_pb2_grpc.AssetServiceStub(channel) for channel in self._pool]
+        # Return the asset stub of the next channel of the pool (round-robin).
+        self._stub_asset = itertools.cycle(self._asset_stubs).__next__
+
+        self.channel = self._pool[0]
+        self.stubBucket = client.opac_pb2_grpc.BucketServiceStub(self.channel)
+        self.stubHealth = client.HealthStub(self.channel)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        """
+        Close the channels of the client.
+        """
+        for channel in self._pool:
+            await channel.close()
+
+    async def status(self, service_name=''):
+        """
+        Check service status.
+
+        Params:
+            :param service_name: service name.
+
+        Return string: UNKNOWN, SERVING
+        """
+        expected_response_status = {
+            0: "NOT SERVING",
+            1: "SERVING",
+            2: "UNKNOWN",
+            3: "NOT FOUND",
+        }
+
+        request = client.health_pb2.HealthCheckRequest(service=service_name)
+
+        try:
+            resp = await self.stubHealth.Check(request)
+        except grpc.RpcError as e:
+            if grpc.StatusCode.NOT_FOUND == e.code():
+                return expected_response_status[3]
+            elif grpc.StatusCode.UNAVAILABLE == e.code():
+                return expected_response_status[0]
+            else:
+                return expected_response_status[2]
+        else:
+            return expected_response_status[resp.status]
+
+    async def add_asset(self, pfile, filename='', filetype='', metadata='',
+                        bucket_name='UNKNOW'):
+        """
+        Add asset to SSM.
+
+        Params:
+            :param pfile: pfile path (Mandatory) or a file pointer
+            :param filetype: string
+            :param metadata: dict or JSON string
+            :param filename: filename is mandatory if pfile is a file pointer
+            :param bucket_name: name of bucket
+
+        Return id of the asset, string of (UUID4)
+
+        Raise ValueError if param metadata is not a dict or str
+        Raise ValueError if not set filename when pfile is a file pointer
+        Raise IOError if pfile is not a file or cant read the file
+        """
+        loop = asyncio.get_running_loop()
+        fp, asset = await loop.run_in_executor(
+            None, client._add_asset_request, pfile, filename, filetype, metadata, bucket_name)
+        filename = asset.filename
+
+        stub = self._stub_asset()
+
+        try:
+            if hasattr(stub, 'prepare_upload') and (client._file_size(fp) or 0) > HTTP_UPLOAD_THRESHOLD:
+                ticket = await stub.prepare_upload(asset)
+                return await loop.run_in_executor(None, client._http_put, ticket, fp)
+
+            if hasattr(stub, 'add_asset_stream'):
+                resp = await stub.add_asset_stream(
+                    _asset_chunks(fp, asset), compression=client._compression(filename))
+                return resp.id
+
+            asset.file = await loop.run_in_executor(None, fp.read)
+            resp = await stub.add_asset(asset, compression=client._compression(filename))
+            return resp.id
+        finally:
+            if fp is not pfile:
+                fp.close()
+
+    async def get_asset(self, _id):
+        """
+        Get asset by id.
+
+        Params:
+            :param _id: string id of the asset (Mandatory)
+
+        Return tuple (True, AssetView) when exist asset and tuple (False, {ERROR_MESSAGE})
+        when asset doesnt exist or other error.
+
+        Raise ValueError if param id is not a str|unicode or not a UUID
+        """
+
+        if not isinstance(_id, str):
+            raise ValueError('Param _id must be a str|unicode.')
+
+        if not client._UUID_RE.fullmatch(_id):
+            raise ValueError('Param _id must be a UUID.')
+
+        try:
+            asset = await self._stub_asset().get_asset(client._TaskId(id=_id))
+        except grpc.RpcError as e:
+            logger.error(e)
+            return (False, {'error_message': e.details()})
+        else:
+            return (True, AssetView(asset))
+
+    async def get_asset_bulk(self, ids, concurrency=32):
+        """
+        Get many assets by id, with up to ``concurrency`` requests in flight
+        spread over the channels of the pool.
+
+        Params:
+            :param ids: iterable of string ids of the assets (Mandatory)
+            :param concurrency: max number of concurrent requests, default=32
+
+        Return a list of the tuples returned by ``get_asset``, in the order of ``ids``.
+
+        Raise ValueError if any id is not a str|unicode or not a UUID, before
+        any request is made
+        Raise ValueError if param concurrency is lower than 1
+        """
+        if concurrency < 1:
+            raise ValueError('Param concurrency must be 1 or more.')
+
+        ids = list(ids)
+
+        for _id in ids:
+            if not isinstance(_id, str):
+                raise ValueError('Param _id must be a str|unicode.')
+
+            if not client._UUID_RE.fullmatch(_id):
+                raise ValueError('Param _id must be a UUID.')
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def get_asset(_id):
+            async with semaphore:
+                return await self.get_asset(_id)
+
+        tasks = [asyncio.ensure_future(get_asset(_id)) for _id in ids]
+
+        try:
+            return await asyncio.gather(*tasks)
+        finally:
+            # Dont leave requests running when one fails or the call is cancelled.
+            for task in tasks:
+                task.cancel()
+
+    async def download_asset(self, _id, pfile):
+        """
+        Download the file of the asset over HTTP, from the URL returned by
+        ``get_asset_info``, without transporting the content through gRPC.
+
+        Params:
+            :param _id: string id of the asset (Mandatory)
+            :param pfile: pfile path (Mandatory) or a file pointer to write the content
+
+        Return tuple (True, {'url': URL, 'size': SIZE}) when the file was downloaded and
+        tuple (False, {ERROR_MESSAGE}) when asset doesnt exist or other error.
+
+        Raise ValueError if param id is not a str|unicode
+        """
+
+        success, asset_info = await self.get_asset_info(_id)
+
+        if not success:
+            return (False, asset_info)
+
+        loop = asyncio.get_running_loop()
+
+        try:
+            size = await loop.run_in_executor(
+                None, client._http_download, asset_info['url'], pfile)
+        except requests.exceptions.RequestException as e:
+            logger.error(e)
+            return (False, {'error_message': str(e)})
+
+        return (True, {'url': asset_info['url'], 'size': size})
+
+    async def query_asset(self, filters=None, metadata=None):
+        """
+        Get assets by any filters and any metadata.
+
+        Params:
+            :param filters: Dictionary
+            :param metadata: JSON with metadada about asset
+
+        Return a list of asset(dict) with all metadata, see ``Client.query_asset``.
+        """
+        resp = await self._stub_asset().query(client._query_request(filters, metadata))
+
+        return client._query_result(resp.assets)
+
+    async def get_bucket(self, _id):
+        """
+        Get bucket by id of asset.
+
+        Params:
+            :param _id: string id of the asset (Mandatory)
+
+        Return tuple (True, Result) when exist asset and tuple (False, {ERROR_MESSAGE})
+        when asset doesnt exist or other error.
+
+        Raise ValueError if param id is not a str|unicode
+        """
+
+        if not isinstance(_id, str):
+            raise ValueError('Param _id must be a str|unicode.')
+        try:
+            bucket = await self._stub_asset().get_bucket(client._TaskId(id=_id))
+        except grpc.RpcError as e:
+            logger.error(e)
+            return (False, {'error_message': e.details()})
+        else:
+            return (True, {'name': bucket.name})
+
+    async def get_asset_info(self, _id):
+        """
+        Get asset info by id.
+
+        Params:
+            :param _id: string id of the asset (Mandatory)
+
+        Return tuple (True, Result) when exist asset and tuple (False, {ERROR_MESSAGE})
+        when asset doesnt exist or other error.
+
+        Raise ValueError if param id is not a str|unicode
+        """
+
+        if not isinstance(_id, str):
+            raise ValueError('Param _id must be a str|unicode.')
+
+        try:
+            asset_info = await self._stub_asset().get_asset_info(client._TaskId(id=_id))
+        except grpc.RpcError as e:
+            logger.error(e)
+            return (False, {'error_message': e.details()})
+
+        return (True, {
+                        'url': asset_info.url,
+                        'url_path': asset_info.url_path
+                    })
+
+    async def get_task_state(self, _id):
+        """
+        Get task state by id
+
+        Params:
+            :param _id: string id of the task (Mandatory)
+
+        Raise ValueError if param id is not a str|unicode
+        """
+
+        if not isinstance(_id, str):
+            raise ValueError('Param _id must be a str|unicode.')
+
+        task_state = await self._stub_asset().get_task_state(client._TaskId(id=_id))
+
+        return task_state.state
+
+    async def update_asset(self, uuid, pfile=None, filename=None, filetype=None, metadata=None,
+                           bucket_name=None):
+        """
+        Update asset to SSM.
+
+        Params:
+            :param uuid: uuid to update
+            :param pfile: pfile path (Mandatory) or a file pointer
+            :param filetype: string
+            :param metadata: dict or JSON string
+            :param filename: filename is mandatory if pfile is a file pointer
+            :param bucket_name: name of bucket
+
+        Return id of the asset, string of (UUID4), or None when the asset doesnt exist
+
+        Raise ValueError if param uuid is not a str|unicode
+        """
+        loop = asyncio.get_running_loop()
+        fp, asset = await loop.run_in_executor(
+            None, client._update_asset_request, uuid, pfile, filename, filetype, metadata, bucket_name)
+        filename = asset.filename
+
+        stub = self._stub_asset()
+
+        try:
+            if fp is None:
+                resp = await stub.update_asset(asset)
+            elif hasattr(stub, 'update_asset_stream'):
+                resp = await stub.update_asset_stream(
+                    _asset_chunks(fp, asset), compression=client._compression(filename))
+            else:
+                asset.file = await loop.run_in_executor(None, fp.read)
+                resp = await stub.update_asset(asset, compression=client._compression(filename))
+        except grpc.RpcError as e:
+            if e.code() != grpc.StatusCode.NOT_FOUND:
+                raise
+            error_msg = "Dont exist asset with id: %s"
+            logger.error(error_msg, uuid)
+        else:
+            return resp.id
+        finally:
+            if fp is not None and fp is not pfile:
+                fp.close()
+
+    async def remove_asset(self, _id):
+        """
+        Task to remove asset by id.
+
+        Params:
+            :param _id: UUID (Mandatory)
+
+        Return None when the asset doesnt exist.
+
+        Raise ValueError if param _id is not a str|unicode or not a UUID
+        """
+
+        if not isinstance(_id, str):
+            raise ValueError('Param "_id" must be a str|unicode.')
+
+        if not client._UUID_RE.fullmatch(_id):
+            raise ValueError('Param "_id" must be a UUID.')
+
+        try:
+            return await self._stub_asset().remove_asset(client._TaskId(id=_id))
+        except grpc.RpcError as e:
+            if e.code() != grpc.StatusCode.NOT_FOUND:
+                raise
+            error_msg = "Dont exist asset with id: %s"
+            logger.error(error_msg, _id)
+
+    async def add_bucket(self, name):
+        """
+        Add bucket.
+
+        Params:
+            :param name: name (Mandatory).
+
+        Return id of the bucket, string of (UUID4)
+
+        Raise ValueError if param name is not a str|unicode
+        """
+
+        if not isinstance(name, str):
+            raise ValueError('Param name must be a str|unicode.')
+
+        resp = await self.stubBucket.add_bucket(client._BucketName(name=name))
+
+        return resp.id
+
+    async def update_bucket(self, name, new_name):
+        """
+        Update bucket.
+
+        Params:
+            :param name: name (Mandatory).
+            :param new_name: new_name (Mandatory).
+
+        Return id of the bucket, string of (UUID4)
+
+        Raise ValueError if param name or new_name is not a str|unicode
+        """
+
+        if not isinstance(name, str):
+            raise ValueError('Param name must be a str|unicode.')
+
+        if not isinstance(new_name, str):
+            raise ValueError('Param new_name must be a str|unicode.')
+
+        resp = await self.stubBucket.update_bucket(
+                    client._BucketName(name=name, new_name=new_name))
+
+        return resp.id
+
+    async def remove_bucket(self, name):
+        """
+        Remove bucket by name.
+
+        Params:
+            :param name: String (Mandatory)
+
+        Return None when the bucket doesnt exist.
+
+        Raise ValueError if param name is not a str|unicode
+        """
+
+        if not isinstance(name, str):
+            raise ValueError('Param "name" must be a str|unicode.')
+
+        try:
+            return await self.stubBucket.remove_bucket(client._BucketName(name=name))
+        except grpc.RpcError as e:
+            if e.code() != grpc.StatusCode.NOT_FOUND:
+                raise
+            error_msg = "Dont exist bucket with name: %s"
+            logger.error(error_msg, name)
+
+    async def get_assets(self, name):
+        """
+        Return a list of asset (AssetView) by bucket.
+
+        Params:
+            :param name: String (Mandatory)
+
+        Raise ValueError if param name is not a str|unicode
+        """
+
+        if not isinstance(name, str):
+            raise ValueError('Param name must be a str|unicode.')
+
+        resp = await self.stubBucket.get_assets(client._BucketName(name=name))
+
+        return [AssetView(asset) for asset in resp.assets]
@@ -1,12 +1,15 @@
 # coding: utf-8
 import os
-import six
-import grpc
+import re
 import json
 import logging
-from imp import reload
-
-from grpc_health.v1 import health_pb2
+import functools
+import itertools
+import threading
+import collections
+import mimetypes
+import requests
+from collections.abc import Mapping
 
 from opac_ssm_api import utils
 
@@ -22,16 +25,454 @@ PROTO_UPDATE = os.getenv('OPAC_SSM_PROTO_UPDATE', 'False') == 'True'
 
 MAX_RECEIVE_MESSAGE_LENGTH = int(os.getenv('MAX_RECEIVE_MESSAGE_LENGTH', 90 * 1024 * 1024))  # 90MB
 MAX_SEND_MESSAGE_LENGTH = int(os.getenv('MAX_SEND_MESSAGE_LENGTH', 90 * 1024 * 1024))  # 90MB
+KEEPALIVE_TIME_MS = int(os.getenv('OPAC_SSM_GRPC_KEEPALIVE_TIME_MS', 5 * 60 * 1000))  # 5min
+KEEPALIVE_TIMEOUT_MS = int(os.getenv('OPAC_SSM_GRPC_KEEPALIVE_TIMEOUT_MS', 10 * 1000))  # 10s
+KEEPALIVE_PERMIT_WITHOUT_CALLS = os.getenv('OPAC_SSM_GRPC_KEEPALIVE_PERMIT_WITHOUT_CALLS', 'False') == 'True'
+ASSET_CHUNK_SIZE = int(os.getenv('OPAC_SSM_ASSET_CHUNK_SIZE', 256 * 1024))  # 256KB
+HTTP_UPLOAD_THRESHOLD = int(os.getenv('OPAC_SSM_HTTP_UPLOAD_THRESHOLD', 4 * 1024 * 1024))  # 4MB
+# Max seconds to connect or between two reads of the HTTP uploads and downloads.
+HTTP_TIMEOUT = float(os.getenv('OPAC_SSM_HTTP_TIMEOUT', 60))  # 60s
+CHANNEL_POOL_SIZE = int(os.getenv('OPAC_SSM_GRPC_CHANNEL_POOL_SIZE', 4))
+
+CHANNEL_OPTIONS = [
+    ('grpc.max_receive_message_length', MAX_RECEIVE_MESSAGE_LENGTH),
+    ('grpc.max_send_message_length', MAX_SEND_MESSAGE_LENGTH),
+    # Detect dead connections. The defaults are accepted by a server with the
+    # default settings, which closes the connection (GOAWAY "too_many_pings")
+    # when pinged more often than every 5min or without calls in flight.
+    ('grpc.keepalive_time_ms', KEEPALIVE_TIME_MS),
+    ('grpc.keepalive_timeout_ms', KEEPALIVE_TIMEOUT_MS),
+    ('grpc.keepalive_permit_without_calls', int(KEEPALIVE_PERMIT_WITHOUT_CALLS)),
+]
+
+# Mimetypes (prefixes) of the files compressed with gzip when sent through gRPC.
+COMPRESSIBLE_TYPES = ('text/', 'application/xml', 'application/json',
+                      'application/javascript', 'image/svg+xml')
+
+# grpc and the pb modules are imported by _lazy_import(), on the first client.
+grpc = health_pb2 = HealthStub = opac_pb2_grpc = opac_pb2 = None
+_Asset = _TaskId = _BucketName = None
+
+# Guards the imports and the updates of the pb modules.
+_import_lock = threading.RLock()
+
+
+def _lazy_import():
+    """
+    Import grpc and the pb modules, generating the pb classes when they
+    dont exist, and bind them to the module names.
+
+    They are imported on the first client instead of on the import of this
+    module, which is slow and may download the proto file.
+    """
+    global grpc, health_pb2, HealthStub, opac_pb2_grpc, opac_pb2
+
+    if opac_pb2 is not None:
+        return
+
+    with _import_lock:
+        # Another thread may have done the imports while this one waited.
+        if opac_pb2 is not None:
+            return
+
+        import grpc as _grpc
+        from grpc_health.v1 import health_pb2 as _health_pb2
+
+        try:
+            from grpc_health.v1.health_pb2_grpc import HealthStub as _HealthStub
+        except ImportError:
+            from grpc_health.v1.health_pb2 import HealthStub as _HealthStub
+
+        try:
+            from opac_ssm_api import opac_pb2_grpc as _opac_pb2_grpc, opac_pb2 as _opac_pb2
+        except ImportError:
+            logger.warning("Retrieving proto file from URL: http://%s:%s%s", HOST_PROTO_NAME, HTTP_PROTO_PORT, PROTO_PATH)
+            # The pb classes cant be imported, generate them even if the proto file is unchanged.
+            utils.generate_pb_files(host=HOST_PROTO_NAME, port=HTTP_PROTO_PORT, proto_path=PROTO_PATH, force=True)
+            from opac_ssm_api import opac_pb2_grpc as _opac_pb2_grpc, opac_pb2 as _opac_pb2
+
+        grpc, health_pb2, HealthStub, opac_pb2_grpc = _grpc, _health_pb2, _HealthStub, _opac_pb2_grpc
+        _bind_pb_classes(_opac_pb2)
+        # opac_pb2 is set last, it marks the imports as done.
+        opac_pb2 = _opac_pb2
+
+
+def _bind_pb_classes(pb2):
+    """
+    Bind the message classes used by the client to module names, so the
+    calls dont look them up in opac_pb2 every time.
+
+    Params:
+        :param pb2: the opac_pb2 module
+    """
+    global _Asset, _TaskId, _BucketName
+
+    _Asset = pb2.Asset
+    _TaskId = pb2.TaskId
+    _BucketName = pb2.BucketName
+
+
+# Proto files (host, port, path) already updated by this process.
+_updated_proto_files = set()
+
+
+def _update_pb_files(host, proto_http_port, proto_path):
+    """
+    Update the pb classes with the proto file of the server, once per process.
+
+    The proto file is only recorded as updated when the update succeeds, so a
+    failed update is tried again by the next client.
+
+    The pb modules are not reloaded: a proto file can't be loaded again with a
+    different content in the descriptor pool of protobuf. The clients update
+    the pb classes before the first import, when the pb classes change after
+    it the process must be restarted to use them.
+    """
+    key = (host, proto_http_port, proto_path)
+
+    if key in _updated_proto_files:
+        return
+
+    with _import_lock:
+        if key in _updated_proto_files:
+            return
+
+        if utils.generate_pb_files(host, proto_http_port, proto_path) and opac_pb2 is not None:
+            logger.warning(
+                "The proto file from URL: http://%s:%s%s changed after the pb classes were imported, "
+                "restart the process to use the new pb classes.", host, proto_http_port, proto_path)
+
+        _updated_proto_files.add(key)
+
+
+EMPTY_METADATA = '{}'
+
+# 8-4-4-4-12 hex digits, with or without the dashes, used with fullmatch().
+_UUID_RE = re.compile(r'[0-9a-f]{8}(-?)[0-9a-f]{4}\1[0-9a-f]{4}\1[0-9a-f]{4}\1[0-9a-f]{12}', re.I)
+
+
+def _dump_metadata(metadata):
+    """
+    Serialize the metadata of an asset to JSON.
+
+    Empty metadata and strings (already serialized) are not encoded. The
+    metadata is always encoded by json, the encoded string is sent as a filter
+    by ``query_asset`` and must match the one sent by ``add_asset``.
+    """
+    if not metadata:
+        return EMPTY_METADATA
+
+    if isinstance(metadata, str):
+        return metadata
+
+    return json.dumps(metadata)
+
+
+def _asset_chunks(fp, asset):
+    """
+    Generate the messages of a streaming upload.
+
+    The first message carries the asset without the file content, the
+    following ones carry the content of ``fp`` read in chunks of
+    ASSET_CHUNK_SIZE bytes.
+    """
+    yield opac_pb2.AssetChunk(metadata=asset)
+
+    while True:
+        data = fp.read(ASSET_CHUNK_SIZE)
+        if not data:
+            break
+        yield opac_pb2.AssetChunk(chunk=data)
+
+
+def _open_pfile(pfile):
+    """
+    Open the file in the path ``pfile`` to be sent to the server.
+
+    The file is opened unbuffered: ``read()`` allocates the content with the
+    size of the file and reads it straight into it, a single copy. Mapping the
+    file with mmap would not save it, protobuf bytes fields only accept
+    ``bytes`` so the map would still have to be copied with ``bytes(mm)``.
+
+    Raise IOError if pfile is not a file or cant read the file
+    """
+    try:
+        return open(pfile, 'rb', buffering=0)
+    except OSError:
+        error_msg = "The file pointed: (%s) is not a file or is unreadable."
+        logger.error(error_msg, pfile)
+        raise IOError(error_msg % pfile)
+
+
+def _compression(filename):
+    """
+    Return the gRPC compression to send the file ``filename``: gzip for
+    text formats (XML, JSON, HTML, ...) and None for the others, usually
+    already compressed (PDF, JPEG, ...).
+    """
+    mimetype, encoding = mimetypes.guess_type(filename)
+
+    if mimetype and not encoding and mimetype.startswith(COMPRESSIBLE_TYPES):
+        return grpc.Compression.Gzip
+
+
+def _file_size(fp):
+    """
+    Return the number of bytes left to read from ``fp`` or None when it is
+    not backed by a file.
+    """
+    try:
+        return os.fstat(fp.fileno()).st_size - fp.tell()
+    except (AttributeError, OSError):
+        return None
+
+
+def _http_put(ticket, fp):
+    """
+    Upload the content of ``fp`` over HTTP with the ticket returned by the
+    ``prepare_upload`` RPC.
+
+    Return id of the asset.
+    """
+    resp = requests.put(ticket.url, data=fp, headers=dict(ticket.headers), timeout=HTTP_TIMEOUT)
+    resp.raise_for_status()
+
+    return ticket.asset_id
+
+
+def _http_download(url, pfile):
+    """
+    Download the file in ``url`` to ``pfile``, a path or a file pointer, in
+    chunks of ASSET_CHUNK_SIZE bytes.
+
+    The file in the path ``pfile`` is removed when the download fails.
+
+    Return the size of the file.
+    """
+    resp = requests.get(url, stream=True, timeout=HTTP_TIMEOUT)
+
+    try:
+        resp.raise_for_status()
+
+        fp = pfile if hasattr(pfile, 'write') else open(pfile, 'wb')
+        size = 0
+
+        try:
+            for chunk in resp.iter_content(chunk_size=ASSET_CHUNK_SIZE):
+                fp.write(chunk)
+                size += len(chunk)
+        except Exception:
+            if fp is not pfile:
+                fp.close()
+                os.remove(pfile)
+            raise
+        finally:
+            if fp is not pfile:
+                fp.close()
+    finally:
+        resp.close()
+
+    return size
+
+
+def _http_upload(stub, fp, asset):
+    """
+    Upload the content of ``fp`` over HTTP to the URL returned by the
+    ``prepare_upload`` RPC, only the asset without the file content goes
+    through gRPC.
+
+    Return id of the asset.
+    """
+    return _http_put(stub.prepare_upload(asset), fp)
+
+
+@functools.lru_cache(maxsize=32)
+def _get_channel_pool(host, port, size=CHANNEL_POOL_SIZE):
+    """
+    Return a tuple of channels to the server, shared by all clients of the
+    process with the same host and port.
+
+    Each channel has a distinct ``grpc.channel_arg_pool_id`` so gRPC does not
+    share a single subchannel (TCP connection) between them.
+    """
+    target = '{0}:{1}'.format(host, port)
+
+    return tuple(
+        grpc.insecure_channel(target, CHANNEL_OPTIONS + [('grpc.channel_arg_pool_id', pool_id)])
+        for pool_id in range(size))
+
+
+class AssetView(Mapping):
+    """
+    Read-only mapping over an asset returned by the server.
+
+    The values are read from the protobuf message on the first access and
+    cached, so the file content is only copied to a Python object when
+    ``view['file']`` is used, and only once.
+    """
+
+    __slots__ = ('asset', '_cache')
+
+    FIELDS = ('file', 'filename', 'type', 'metadata', 'uuid', 'bucket', 'checksum')
+
+    def __init__(self, asset):
+        self.asset = asset
+        self._cache = {}
+
+    def __getitem__(self, key):
+        try:
+            return self._cache[key]
+        except KeyError:
+            if key not in self.FIELDS:
+                raise
+        value = self._cache[key] = getattr(self.asset, key)
+        return value
+
+    def __iter__(self):
+        return iter(self.FIELDS)
+
+    def __len__(self):
+        return len(self.FIELDS)
+
+    def __repr__(self):
+        return '{0}({1!r})'.format(self.__class__.__name__, self.to_dict())
+
+    def to_dict(self):
+        """
+        Return a dict with all values of the asset.
+        """
+        return dict(self)
+
+
+def _add_asset_request(pfile, filename, filetype, metadata, bucket_name):
+    """
+    Check the params of ``add_asset`` and open the file.
+
+    Return tuple (file pointer, Asset without the file content).
+    """
+    if metadata and not isinstance(metadata, (dict, str)):
+        raise ValueError('Param "metadata" must be a Dict, str or None.')
+
+    if hasattr(pfile, 'read'):
+        if not filename:
+            raise ValueError('Param "filename" is required')
+        else:
+            fp = pfile
+    else:
+        fp = _open_pfile(pfile)
+        filename = os.path.basename(pfile)
+
+    asset = _Asset(
+        filename=filename,
+        type=filetype,
+        metadata=_dump_metadata(metadata),
+        bucket=bucket_name
+    )
+
+    return fp, asset
+
+
+def _update_asset_request(uuid, pfile, filename, filetype, metadata, bucket_name):
+    """
+    Check the params of ``update_asset`` and open the file, if any.
+
+    Return tuple (file pointer or None, Asset without the file content).
+    """
+    if not isinstance(uuid, str):
+        raise ValueError('Param "uuid" must be a str|unicode.')
 
-try:
-    from opac_ssm_api import opac_pb2_grpc, opac_pb2
-except ImportError:
-    logger.warning("Retrieving proto file from URL: http://%s:%s%s", HOST_PROTO_NAME, HTTP_PROTO_PORT, PROTO_PATH)
-    utils.generate_pb_files(host=HOST_PROTO_NAME, port=HTTP_PROTO_PORT, proto_path=PROTO_PATH)
-    from opac_ssm_api import opac_pb2_grpc, opac_pb2
+    asset = _Asset()
+    asset.uuid = uuid
+
+    if metadata and not isinstance(metadata, (dict, str)):
+        raise ValueError('Param "metadata" must be a Dict, str or None.')
+    else:
+        asset.metadata = _dump_metadata(metadata)
+
+    if filetype:
+        asset.type = filetype
+
+    if bucket_name:
+        asset.bucket = bucket_name
+
+    fp = None
+
+    if pfile is not None:
+        if hasattr(pfile, 'read'):
+            if not filename:
+                raise IOError('Param "filename" is required')
+            else:
+                fp = pfile
+        else:
+            fp = _open_pfile(pfile)
+            filename = os.path.basename(pfile)
+
+        asset.filename = filename
+
+    return fp, asset
+
+
+def _query_request(filters, metadata):
+    """
+    Check the params of ``query_asset``.
+
+    Return the Asset with the filters of the query.
+    """
+    if filters is None:
+        filters = {}
+    elif not isinstance(filters, dict):
+        raise ValueError('Param "filters" must be a Dict or None.')
+
+    if metadata:
+        if isinstance(metadata, (dict, str)):
+            filters['metadata'] = _dump_metadata(metadata)
+        else:
+            raise ValueError("Metadada must be a dict or str")
+
+    return _Asset(**filters)
+
+
+def _query_result(assets):
+    """
+    Return the assets found by ``query_asset`` as a list of dicts.
+    """
+    ret_list = []
+
+    for asset in assets:
+        ret_list.append({
+            'type': asset.type,
+            'absolute_url': asset.absolute_url,
+            'full_absolute_url': asset.full_absolute_url,
+            'bucket': asset.bucket,
+            'checksum': asset.checksum,
+            'filename': asset.filename,
+            'uuid': asset.uuid,
+            'metadata': asset.metadata,
+            'created_at': asset.created_at,
+            'updated_at': asset.updated_at,
+        })
+
+    return ret_list
+
+
+def _asset_result(future):
+    """
+    Return the result of a ``get_asset`` future as returned by ``Client.get_asset``.
+    """
+    try:
+        asset = future.result()
+    except grpc.RpcError as e:
+        logger.error(e)
+        return (False, {'error_message': e.details()})
+    else:
+        return (True, AssetView(asset))
 
 
 class Client(object):
+    """
+    Synchronous client of the SSM, see ``opac_ssm_api.aio_client.AsyncClient``
+    for the asyncio one.
+    """
 
     def __init__(self, host=HOST_NAME, port=HOST_PORT, proto_http_port=HTTP_PROTO_PORT,
                  proto_path=PROTO_PATH, update_pb_class=PROTO_UPDATE):
@@ -45,16 +486,35 @@ class Client(object):
             :param: proto_path: string, default='/static/proto/opac.proto' (default path to proto file)
         """
         if update_pb_class:
-            utils.generate_pb_files(host, proto_http_port, proto_path)
-            reload(opac_pb2_grpc)
+            _update_pb_files(host, proto_http_port, proto_path)
+
+        _lazy_import()
 
-        options = [('grpc.max_receive_message_length', MAX_RECEIVE_MESSAGE_LENGTH),
-                   ('grpc.max_send_message_length', MAX_SEND_MESSAGE_LENGTH)]
+        self._pool = _get_channel_pool(host, str(port))
+        self._asset_stubs = [opac_pb2_grpc.AssetServiceStub(channel) for channel in self._pool]
+        # Return the asset stub of the next channel of the pool (round-robin).
+        self._stub_asset = itertools.cycle(self._asset_stubs).__next__
+        self._tl = threading.local()
 
-        self.channel = grpc.insecure_channel('{0}:{1}'.format(host, port), options)
-        self.stubAsset = opac_pb2_grpc.AssetServiceStub(self.channel)
+        self.channel = self._pool[0]
+        self.stubAsset = self._asset_stubs[0]
         self.stubBucket = opac_pb2_grpc.BucketServiceStub(self.channel)
-        self.stubHealth = health_pb2.HealthStub(self.channel)
+        self.stubHealth = HealthStub(self.channel)
+
+    def _task_id(self, _id):
+        """
+        Return the TaskId message of the current thread set to ``_id``.
+
+        The message is reused between calls, the stubs serialize it before the
+        call returns.
+        """
+        task_id = getattr(self._tl, 'task_id', None)
+
+        if task_id is None:
+            task_id = self._tl.task_id = _TaskId()
+
+        task_id.id = _id
+        return task_id
 
     def status(self, service_name=''):
         """
@@ -94,50 +554,34 @@ class Client(object):
         Params:
             :param pfile: pfile path (Mandatory) or a file pointer
             :param filetype: string
-            :param metadata: dict
+            :param metadata: dict or JSON string
             :param filename: filename is mandatory if pfile is a file pointer
             :param bucket_name: name of bucket
 
         Return id of the asset, string of (UUID4)
 
-        Raise ValueError if param metadata is not a dict
+        Raise ValueError if param metadata is not a dict or str
         Raise ValueError if not set filename when pfile is a file pointer
         Raise IOError if pfile is not a file or cant read the file
         """
-        if not metadata:
-            metadata = {}
-        elif not isinstance(metadata, dict):
-            error_msg = 'Param "metadata" must be a Dict or None.'
-            logger.error(error_msg)
-            raise ValueError(error_msg)
+        fp, asset = _add_asset_request(pfile, filename, filetype, metadata, bucket_name)
+        filename = asset.filename
 
-        if hasattr(pfile, 'read'):
-            if not filename:
-                error_msg = 'Param "filename" is required'
-                logger.error(error_msg)
-                raise ValueError(error_msg)
-            else:
-                filename = filename
-                file_content = pfile.read()
-        else:
-            if os.path.isfile(pfile) and os.access(pfile, os.R_OK):
-                with open(pfile, 'rb') as fp:
-                    filename = os.path.basename(getattr(fp, 'name', None))
-                    file_content = fp.read()
-            else:
-                error_msg = "The file pointed: (%s) is not a file or is unreadable."
-                logger.error(error_msg, pfile)
-                raise IOError(error_msg)
+        stub = self._stub_asset()
 
-        asset = opac_pb2.Asset(
-            file=file_content,
-            filename=filename,
-            type=filetype,
-            metadata=json.dumps(metadata),
-            bucket=bucket_name
-        )
+        try:
+            if hasattr(stub, 'prepare_upload') and (_file_size(fp) or 0) > HTTP_UPLOAD_THRESHOLD:
+                return _http_upload(stub, fp, asset)
+
+            if hasattr(stub, 'add_asset_stream'):
+                return stub.add_asset_stream(
+                    _asset_chunks(fp, asset), compression=_compression(filename)).id
 
-        return self.stubAsset.add_asset(asset).id
+            asset.file = fp.read()
+            return stub.add_asset(asset, compression=_compression(filename)).id
+        finally:
+            if fp is not pfile:
+                fp.close()
 
     def get_asset(self, _id):
         """
@@ -146,29 +590,95 @@ class Client(object):
         Params:
             :param _id: string id of the asset (Mandatory)
 
-        Return tuple (True  ) when exist asset and tuple (False, {ERROR_MESSAGE})
+        Return tuple (True, AssetView) when exist asset and tuple (False, {ERROR_MESSAGE})
         when asset doesnt exist or other error.
 
-        Raise ValueError if param id is not a str|unicode
+        AssetView is a read-only mapping (use ``to_dict()`` to get a dict) with the
+        keys: file, filename, type, metadata, uuid, bucket, checksum.
+
+        Raise ValueError if param id is not a str|unicode or not a UUID
         """
 
-        if not isinstance(_id, six.string_types):
-            msg = 'Param _id must be a str|unicode.'
-            logger.exception(msg)
-            raise ValueError(msg)
+        if not isinstance(_id, str):
+            raise ValueError('Param _id must be a str|unicode.')
+
+        if not _UUID_RE.fullmatch(_id):
+            raise ValueError('Param _id must be a UUID.')
+
         try:
-            asset = self.stubAsset.get_asset(opac_pb2.TaskId(id=_id))
+            asset = self._stub_asset().get_asset(self._task_id(_id))
         except Exception as e:
             logger.error(e)
             return (False, {'error_message': e.details()})
         else:
-            return (True, {'file': asset.file,
-                           'filename': asset.filename,
-                           'type': asset.type,
-                           'metadata': asset.metadata,
-                           'uuid': asset.uuid,
-                           'bucket': asset.bucket,
-                           'checksum': asset.checksum})
+            return (True, AssetView(asset))
+
+    def get_asset_bulk(self, ids, concurrency=32):
+        """
+        Get many assets by id, with up to ``concurrency`` requests in flight
+        spread over the channels of the pool.
+
+        Params:
+            :param ids: iterable of string ids of the assets (Mandatory)
+            :param concurrency: max number of concurrent requests, default=32
+
+        Return a generator of the tuples returned by ``get_asset``, in the order of ``ids``.
+
+        Raise ValueError if any id is not a str|unicode or not a UUID
+        Raise ValueError if param concurrency is lower than 1
+        """
+
+        if concurrency < 1:
+            raise ValueError('Param concurrency must be 1 or more.')
+
+        pending = collections.deque()
+
+        try:
+            for _id in ids:
+                if not isinstance(_id, str):
+                    raise ValueError('Param ids must contain only str|unicode.')
+
+                if not _UUID_RE.fullmatch(_id):
+                    raise ValueError('Param ids must contain only UUIDs.')
+
+                pending.append(self._stub_asset().get_asset.future(_TaskId(id=_id)))
+
+                if len(pending) >= concurrency:
+                    yield _asset_result(pending.popleft())
+
+            while pending:
+                yield _asset_result(pending.popleft())
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def download_asset(self, _id, pfile):
+        """
+        Download the file of the asset over HTTP, from the URL returned by
+        ``get_asset_info``, without transporting the content through gRPC.
+
+        Params:
+            :param _id: string id of the asset (Mandatory)
+            :param pfile: pfile path (Mandatory) or a file pointer to write the content
+
+        Return tuple (True, {'url': URL, 'size': SIZE}) when the file was downloaded and
+        tuple (False, {ERROR_MESSAGE}) when asset doesnt exist or other error.
+
+        Raise ValueError if param id is not a str|unicode
+        """
+
+        success, asset_info = self.get_asset_info(_id)
+
+        if not success:
+            return (False, asset_info)
+
+        try:
+            size = _http_download(asset_info['url'], pfile)
+        except requests.exceptions.RequestException as e:
+            logger.error(e)
+            return (False, {'error_message': str(e)})
+
+        return (True, {'url': asset_info['url'], 'size': size})
 
     def query_asset(self, filters=None, metadata=None):
         """
@@ -201,44 +711,9 @@ class Client(object):
         ]
         """
 
-        if filters is None:
-            filters = {}
-        elif not isinstance(filters, dict):
-            error_msg = 'Param "filters" must be a Dict or None.'
-            logger.error(error_msg)
-            raise ValueError(error_msg)
+        assets = self._stub_asset().query(_query_request(filters, metadata)).assets
 
-        if metadata:
-            if isinstance(metadata, str):
-                filters['metadata'] = metadata
-            elif isinstance(metadata, dict):
-                filters['metadata'] = json.dumps(metadata)
-            else:
-                raise ValueError("Metadada must be a dict or str")
-
-        assets = self.stubAsset.query(opac_pb2.Asset(**filters)).assets
-
-        ret_list = []
-
-        if assets:
-
-            dict_asset = {}
-
-            for asset in assets:
-                dict_asset['type'] = asset.type
-                dict_asset['absolute_url'] = asset.absolute_url
-                dict_asset['full_absolute_url'] = asset.full_absolute_url
-                dict_asset['bucket'] = asset.bucket
-                dict_asset['checksum'] = asset.checksum
-                dict_asset['filename'] = asset.filename
-                dict_asset['uuid'] = asset.uuid
-                dict_asset['metadata'] = asset.metadata
-                dict_asset['created_at'] = asset.created_at
-                dict_asset['updated_at'] = asset.updated_at
-
-                ret_list.append(dict_asset)
-
-        return ret_list
+        return _query_result(assets)
 
     def get_bucket(self, _id):
         """
@@ -253,12 +728,10 @@ class Client(object):
         Raise ValueError if param id is not a str|unicode
         """
 
-        if not isinstance(_id, six.string_types):
-            msg = 'Param _id must be a str|unicode.'
-            logger.exception(msg)
-            raise ValueError(msg)
+        if not isinstance(_id, str):
+            raise ValueError('Param _id must be a str|unicode.')
         try:
-            bucket = self.stubAsset.get_bucket(opac_pb2.TaskId(id=_id))
+            bucket = self._stub_asset().get_bucket(self._task_id(_id))
         except Exception as e:
             logger.error(e)
             return (False, {'error_message': e.details()})
@@ -278,13 +751,11 @@ class Client(object):
         Raise ValueError if param id is not a str|unicode
         """
 
-        if not isinstance(_id, six.string_types):
-            msg = 'Param _id must be a str|unicode.'
-            logger.exception(msg)
-            raise ValueError(msg)
+        if not isinstance(_id, str):
+            raise ValueError('Param _id must be a str|unicode.')
 
         try:
-            asset_info = self.stubAsset.get_asset_info(opac_pb2.TaskId(id=_id))
+            asset_info = self._stub_asset().get_asset_info(self._task_id(_id))
         except Exception as e:
             logger.error(e)
             return (False, {'error_message': e.details()})
@@ -304,12 +775,10 @@ class Client(object):
         Raise ValueError if param id is not a str|unicode
         """
 
-        if not isinstance(_id, six.string_types):
-            msg = 'Param _id must be a str|unicode.'
-            logger.exception(msg)
-            raise ValueError(msg)
+        if not isinstance(_id, str):
+            raise ValueError('Param _id must be a str|unicode.')
 
-        task_state = self.stubAsset.get_task_state(opac_pb2.TaskId(id=_id))
+        task_state = self._stub_asset().get_task_state(self._task_id(_id))
 
         return task_state.state
 
@@ -322,67 +791,38 @@ class Client(object):
             :param uuid: uuid to update
             :param pfile: pfile path (Mandatory) or a file pointer
             :param filetype: string
-            :param metadata: dict
+            :param metadata: dict or JSON string
             :param filename: filename is mandatory if pfile is a file pointer
             :param bucket_name: name of bucket
 
-        Return id of the asset, string of (UUID4)
+        Return id of the asset, string of (UUID4), or None when the asset doesnt exist
 
         Raise ValueError if param uuid is not a str|unicode
         """
 
-        if not isinstance(uuid, six.string_types):
-            raise ValueError('Param "uuid" must be a str|unicode.')
+        fp, asset = _update_asset_request(uuid, pfile, filename, filetype, metadata, bucket_name)
+        filename = asset.filename
 
-        update_params = {}
+        stub = self._stub_asset()
 
-        if self.stubAsset.exists_asset(opac_pb2_grpc.TaskId(id=uuid)):
+        try:
+            if fp is None:
+                return stub.update_asset(asset).id
 
-            update_params['uuid'] = uuid
+            if hasattr(stub, 'update_asset_stream'):
+                return stub.update_asset_stream(
+                    _asset_chunks(fp, asset), compression=_compression(filename)).id
 
-            if not metadata:
-                update_params['metadata'] = json.dumps({})
-            elif not isinstance(metadata, dict):
-                error_msg = 'Param "metadata" must be a Dict or None.'
-                logger.exception(error_msg)
-                raise ValueError(error_msg)
-            else:
-                update_params['metadata'] = json.dumps(metadata)
-
-            if pfile is not None:
-                if hasattr(pfile, 'read'):
-                    if not filename:
-                        error_msg = 'Param "filename" is required'
-                        logger.exception(error_msg)
-                        raise IOError(error_msg)
-                    else:
-                        filename = filename
-                        file_content = pfile.read()
-                else:
-                    if os.path.isfile(pfile) and os.access(pfile, os.R_OK):
-                        with open(pfile, 'rb') as fp:
-                            filename = os.path.basename(getattr(fp, 'name', None))
-                            file_content = fp.read()
-                    else:
-                        error_msg = "The file pointed: (%s) is not a file or is unreadable."
-                        logger.error(error_msg, pfile)
-                        raise IOError(error_msg)
-
-                update_params['file'] = file_content
-                update_params['filename'] = filename
-
-            if filetype:
-                update_params['type'] = filetype
-
-            if bucket_name:
-                update_params['bucket'] = bucket_name
-
-            asset = opac_pb2.Asset(**update_params)
-
-            return self.stubAsset.update_asset(asset).id
-        else:
+            asset.file = fp.read()
+            return stub.update_asset(asset, compression=_compression(filename)).id
+        except grpc.RpcError as e:
+            if e.code() != grpc.StatusCode.NOT_FOUND:
+                raise
             error_msg = "Dont exist asset with id: %s"
             logger.error(error_msg, uuid)
+        finally:
+            if fp is not None and fp is not pfile:
+                fp.close()
 
     def remove_asset(self, _id):
         """
@@ -391,14 +831,24 @@ class Client(object):
         Params:
             :param _id: UUID (Mandatory)
 
-        Raise ValueError if param _id is not a str|unicode
+        Return None when the asset doesnt exist.
+
+        Raise ValueError if param _id is not a str|unicode or not a UUID
         """
 
-        if not isinstance(_id, six.string_types):
+        if not isinstance(_id, str):
             raise ValueError('Param "_id" must be a str|unicode.')
 
-        if self.stubAsset.exists_asset(opac_pb2.TaskId(id=_id)):
-            return self.stubAsset.remove_asset(opac_pb2.TaskId(id=_id))
+        if not _UUID_RE.fullmatch(_id):
+            raise ValueError('Param "_id" must be a UUID.')
+
+        try:
+            return self._stub_asset().remove_asset(self._task_id(_id))
+        except grpc.RpcError as e:
+            if e.code() != grpc.StatusCode.NOT_FOUND:
+                raise
+            error_msg = "Dont exist asset with id: %s"
+            logger.error(error_msg, _id)
 
     def add_bucket(self, name):
         """
@@ -412,12 +862,10 @@ class Client(object):
         Raise ValueError if param name is not a str|unicode
         """
 
-        if not isinstance(name, six.string_types):
-            msg = 'Param name must be a str|unicode.'
-            logger.exception(msg)
-            raise ValueError(msg)
+        if not isinstance(name, str):
+            raise ValueError('Param name must be a str|unicode.')
 
-        return self.stubBucket.add_bucket(opac_pb2.BucketName(name=name)).id
+        return self.stubBucket.add_bucket(_BucketName(name=name)).id
 
     def update_bucket(self, name, new_name):
         """
@@ -432,18 +880,14 @@ class Client(object):
         Raise ValueError if param name or new_name is not a str|unicode
         """
 
-        if not isinstance(name, six.string_types):
-            msg = 'Param name must be a str|unicode.'
-            logger.exception(msg)
-            raise ValueError(msg)
+        if not isinstance(name, str):
+            raise ValueError('Param name must be a str|unicode.')
 
-        if not isinstance(new_name, six.string_types):
-            msg = 'Param new_name must be a str|unicode.'
-            logger.exception(msg)
-            raise ValueError(msg)
+        if not isinstance(new_name, str):
+            raise ValueError('Param new_name must be a str|unicode.')
 
-        return self.stubBucket.add_update(
-                    opac_pb2.BucketName(name=name, new_name=new_name)).id
+        return self.stubBucket.update_bucket(
+                    _BucketName(name=name, new_name=new_name)).id
 
     def remove_bucket(self, name):
         """
@@ -452,18 +896,25 @@ class Client(object):
         Params:
             :param name: String (Mandatory)
 
+        Return None when the bucket doesnt exist.
+
         Raise ValueError if param name is not a str|unicode
         """
 
-        if not isinstance(name, six.string_types):
+        if not isinstance(name, str):
             raise ValueError('Param "name" must be a str|unicode.')
 
-        if self.stubBucket.exists_bucket(opac_pb2.BucketName(name=name)):
-            return self.stubBucket.remove_bucket(opac_pb2.BucketName(name=name))
+        try:
+            return self.stubBucket.remove_bucket(_BucketName(name=name))
+        except grpc.RpcError as e:
+            if e.code() != grpc.StatusCode.NOT_FOUND:
+                raise
+            error_msg = "Dont exist bucket with name: %s"
+            logger.error(error_msg, name)
 
     def get_assets(self, name):
         """
-        Return a list of asset by bucket.
+        Return a list of asset (AssetView) by bucket.
 
         Params:
             :param name: String (Mandatory)
@@ -471,22 +922,12 @@ class Client(object):
         Raise ValueError if param name is not a str|unicode
         """
 
-        result = []
+        if not isinstance(name, str):
+            raise ValueError('Param name must be a str|unicode.')
 
-        if not isinstance(name, six.string_types):
-            msg = 'Param name must be a str|unicode.'
-            logger.exception(msg)
-            raise ValueError(msg)
+        assets = self.stubBucket.get_assets(_BucketName(name=name)).assets
 
-        assets = self.stubBucket.get_assets(opac_pb2.BucketName(name=name)).assets
+        return [AssetView(asset) for asset in assets]
 
-        for asset in assets:
-            result.append({'file': asset.file,
-                           'filename': asset.filename,
-                           'type': asset.type,
-                           'metadata': asset.metadata,
-                           'uuid': asset.uuid,
-                           'bucket': asset.bucket,
-                           'checksum': asset.checksum})
 
-        return result
+SyncClient = Client
@@ -1,57 +1,121 @@
 #!/usr/bin/python
 # coding: UTF-8
 import os
+import json
 import requests
 import logging
 
-from grpc.tools import protoc
-
 
 logger = logging.getLogger(__name__)
 PATH_PB_FILES = os.path.abspath(os.path.dirname(__file__))
+PROTO_FILE = '{0}/opac.proto'.format(PATH_PB_FILES)
+PROTO_VALIDATORS_FILE = '{0}/opac.proto.validators'.format(PATH_PB_FILES)
+
+
+def _read_validators():
+    """
+    Return the HTTP validators (ETag, Last-Modified) of the saved proto file.
+    """
+    if not os.path.isfile(PROTO_FILE):
+        return {}
+
+    try:
+        with open(PROTO_VALIDATORS_FILE) as fp:
+            return json.load(fp)
+    except (IOError, ValueError):
+        return {}
 
 
 def get_proto_file(host='localhost', port='80', proto_path='/static/proto/opac.proto'):
     """
     Get the proto file and save.
+
+    The request is conditional (If-None-Match/If-Modified-Since) on the saved
+    proto file, so an unchanged file is not downloaded again.
+
+    Return True if the saved proto file was changed.
     """
 
     url = 'http://{0}:{1}{2}'.format(host, port, proto_path)
 
+    validators = _read_validators()
+    headers = {}
+
+    if validators.get('etag'):
+        headers['If-None-Match'] = validators['etag']
+
+    if validators.get('last_modified'):
+        headers['If-Modified-Since'] = validators['last_modified']
+
     try:
-        resp = requests.get(url)
+        resp = requests.get(url, headers=headers)
     except (requests.exceptions.ConnectionError) as e:
         logger.error(
             "Fail when getting the proto file from: %s. Error: %s",
             url, str(e))
         raise e
     else:
-        if resp.status_code == 200:
-            filename = '{0}/opac.proto'.format(PATH_PB_FILES)
-            with open(filename, 'w') as fp:
-                fp.write(resp.text)
+        if resp.status_code == 304:
+            return False
+        elif resp.status_code == 200:
+            if os.path.isfile(PROTO_FILE):
+                with open(PROTO_FILE) as fp:
+                    changed = fp.read() != resp.text
+            else:
+                changed = True
+
+            if changed:
+                with open(PROTO_FILE, 'w') as fp:
+                    fp.write(resp.text)
+
+            with open(PROTO_VALIDATORS_FILE, 'w') as fp:
+                json.dump({'etag': resp.headers.get('ETag'),
+                           'last_modified': resp.headers.get('Last-Modified')}, fp)
+
+            return changed
         else:
             logger.error(
                 "Unexpected response when getting the proto file from: %s. Error (status code): %s",
                 url, resp.status_code)
+            return False
 
 
-def generate_pb_files(host='localhost', port='80', proto_path='/static/proto/opac.proto'):
+def generate_pb_files(host='localhost', port='80', proto_path='/static/proto/opac.proto', force=False):
     """
     Generete de pb classes.
+
+    The classes are only generated again when the proto file changed, when
+    they dont exist or when ``force`` is True.
+
+    Return True if the pb classes were generated.
     """
 
-    get_proto_file(host=host, port=port, proto_path=proto_path)
+    changed = get_proto_file(host=host, port=port, proto_path=proto_path)
+
+    pb_files_exist = all(
+        os.path.isfile('{0}/{1}'.format(PATH_PB_FILES, name)) for name in ('opac_pb2.py', 'opac_pb2_grpc.py'))
+
+    if not changed and not force and pb_files_exist:
+        return False
+
+    import grpc_tools
+    from grpc.tools import protoc
+
+    # The well-known types (google/protobuf/*.proto) shipped with grpcio-tools.
+    well_known_protos_path = os.path.join(os.path.dirname(grpc_tools.__file__), '_proto')
 
     try:
         protoc.main((
           '',
           '--proto_path={0}'.format(PATH_PB_FILES),
+          '--proto_path={0}'.format(well_known_protos_path),
           '--python_out={0}'.format(PATH_PB_FILES),
           '--grpc_python_out={0}'.format(PATH_PB_FILES),
-          '{0}/opac.proto'.format(PATH_PB_FILES)
+          PROTO_FILE
         ))
     except Exception as e:
         msg = "Error found when generating PB files. Exception: %s"
         logger.error(msg, str(e))
         raise e
+    else:
+        return True
@@ -0,0 +1,98 @@
+# coding: utf-8
+import os
+import sys
+import atexit
+import shutil
+import tempfile
+
+import grpc
+import grpc_tools
+from grpc.tools import protoc
+
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES_PATH = os.path.join(ROOT_PATH, 'tests', 'fixtures')
+PB_FILES_PATH = tempfile.mkdtemp()
+atexit.register(shutil.rmtree, PB_FILES_PATH, True)
+
+IMPORT_PROTO = """syntax = "proto3";
+
+import "google/protobuf/timestamp.proto";
+
+message AssetDates {
+  google.protobuf.Timestamp created_at = 1;
+}
+"""
+
+
+def fixture_proto():
+    """
+    Return the content of the proto file of the fixtures.
+    """
+    with open(os.path.join(FIXTURES_PATH, 'opac.proto')) as fp:
+        return fp.read()
+
+
+def proto_with_import():
+    """
+    Return the proto file of the fixtures importing a well-known type.
+    """
+    return fixture_proto().replace('syntax = "proto3";', IMPORT_PROTO)
+
+
+def generate_pb_files(proto=None):
+    """
+    Generate the pb classes of ``proto`` (default the proto file of the
+    fixtures) in PB_FILES_PATH.
+    """
+    with open(os.path.join(PB_FILES_PATH, 'opac.proto'), 'w') as fp:
+        fp.write(proto or fixture_proto())
+
+    status = protoc.main((
+        '',
+        '--proto_path={0}'.format(PB_FILES_PATH),
+        '--proto_path={0}'.format(os.path.join(os.path.dirname(grpc_tools.__file__), '_proto')),
+        '--python_out={0}'.format(PB_FILES_PATH),
+        '--grpc_python_out={0}'.format(PB_FILES_PATH),
+        'opac.proto'
+    ))
+
+    if status != 0:
+        raise RuntimeError('protoc failed to generate the pb classes')
+
+
+def load_client(proto=None):
+    """
+    Return the client module, with the pb classes of ``proto`` (default the
+    proto file of the fixtures) imported.
+    """
+    from opac_ssm_api import client
+
+    if client.opac_pb2 is None:
+        generate_pb_files(proto)
+        sys.path.insert(0, PB_FILES_PATH)
+
+        import opac_pb2
+        import opac_pb2_grpc
+
+        sys.modules['opac_ssm_api.opac_pb2'] = opac_pb2
+        sys.modules['opac_ssm_api.opac_pb2_grpc'] = opac_pb2_grpc
+
+        client._lazy_import()
+
+    return client
+
+
+class FakeRpcError(grpc.RpcError):
+    """
+    RpcError raised by the fake stubs with the status ``code``.
+    """
+
+    def __init__(self, code):
+        self._code = code
+
+    def code(self):
+        return self._code
+
+    def details(self):
+        return self._code.name
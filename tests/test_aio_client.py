@@ -0,0 +1,200 @@
+# coding: utf-8
+import io
+import os
+import shutil
+import asyncio
+import tempfile
+import unittest
+from unittest import mock
+
+from tests import helpers
+
+
+client = helpers.load_client()
+
+from opac_ssm_api import aio_client  # noqa: E402
+
+
+IDS = ['%08d-0000-0000-0000-000000000000' % n for n in range(5)]
+
+
+class FakeAssetStub(object):
+
+    def __init__(self, fail_id=None):
+        self.fail_id = fail_id
+        self.requested = []
+        self.cancelled = []
+
+    async def get_asset(self, task_id):
+        self.requested.append(task_id.id)
+
+        if task_id.id == self.fail_id:
+            raise RuntimeError('get_asset failed')
+
+        try:
+            # The ids after the failed one are slower.
+            await asyncio.sleep(0.01 if self.fail_id is None else 10)
+        except asyncio.CancelledError:
+            self.cancelled.append(task_id.id)
+            raise
+
+        return client._Asset(uuid=task_id.id)
+
+
+class AsyncClientTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.cli = aio_client.AsyncClient(pool_size=1)
+        self.addAsyncCleanup(self.cli.close)
+
+    def set_stub(self, stub):
+        self.cli._stub_asset = lambda: stub
+
+    async def test_get_asset_bulk_keeps_the_order_of_ids(self):
+        self.set_stub(FakeAssetStub())
+
+        results = await self.cli.get_asset_bulk(reversed(IDS), concurrency=2)
+
+        self.assertEqual([asset['uuid'] for success, asset in results], IDS[::-1])
+
+    async def test_get_asset_bulk_checks_the_ids_before_the_requests(self):
+        stub = FakeAssetStub()
+        self.set_stub(stub)
+
+        with self.assertRaises(ValueError):
+            await self.cli.get_asset_bulk(IDS + ['invalid'])
+
+        self.assertEqual(stub.requested, [])
+
+    async def test_get_asset_bulk_with_invalid_concurrency(self):
+        stub = FakeAssetStub()
+        self.set_stub(stub)
+
+        for concurrency in (0, -1):
+            with self.assertRaises(ValueError):
+                await asyncio.wait_for(self.cli.get_asset_bulk(IDS, concurrency=concurrency), 1)
+
+        self.assertEqual(stub.requested, [])
+
+    async def test_get_asset_bulk_cancels_the_requests_on_error(self):
+        stub = FakeAssetStub(fail_id=IDS[0])
+        self.set_stub(stub)
+
+        with self.assertRaises(RuntimeError):
+            await self.cli.get_asset_bulk(IDS)
+
+        await asyncio.sleep(0)
+        self.assertEqual(sorted(stub.cancelled), IDS[1:])
+
+    async def test_asset_chunks(self):
+        asset = client._Asset(filename='a.txt')
+
+        with mock.patch.object(aio_client, 'ASSET_CHUNK_SIZE', 3), \
+                mock.patch.object(client, 'opac_pb2', mock.Mock(AssetChunk=dict)):
+            chunks = [chunk async for chunk in aio_client._asset_chunks(io.BytesIO(b'abcdefg'), asset)]
+
+        self.assertEqual(chunks, [{'metadata': asset}, {'chunk': b'abc'}, {'chunk': b'def'}, {'chunk': b'g'}])
+
+    async def test_update_pb_class(self):
+        with mock.patch.object(client, '_update_pb_files') as update_pb_files:
+            cli = aio_client.AsyncClient(proto_http_port='8103', proto_path='/opac.proto',
+                                         update_pb_class=True, pool_size=1)
+            await cli.close()
+
+        update_pb_files.assert_called_once_with('localhost', '8103', '/opac.proto')
+
+
+class AsyncHttpTest(unittest.IsolatedAsyncioTestCase):
+
+    url = 'http://ssm/media/a.txt'
+
+    async def asyncSetUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+
+        self.stub = mock.Mock(spec=['prepare_upload', 'add_asset'])
+        self.stub.prepare_upload = mock.AsyncMock(
+            return_value=mock.Mock(url=self.url, headers={}, asset_id='id'))
+        self.stub.add_asset = mock.AsyncMock(return_value=client._TaskId(id='grpc-id'))
+
+        self.cli = aio_client.AsyncClient(pool_size=1)
+        self.addAsyncCleanup(self.cli.close)
+        self.cli._stub_asset = lambda: self.stub
+        self.cli.get_asset_info = mock.AsyncMock(return_value=(True, {'url': self.url, 'url_path': '/media/a.txt'}))
+
+        patcher = mock.patch.object(aio_client, 'HTTP_UPLOAD_THRESHOLD', 4)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.pfile = os.path.join(self.path, 'a.txt')
+
+        with open(self.pfile, 'wb') as fp:
+            fp.write(b'content')
+
+    @mock.patch.object(client.requests, 'put')
+    async def test_add_asset_over_http_above_the_threshold(self, put):
+        self.assertEqual(await self.cli.add_asset(self.pfile), 'id')
+
+        self.assertEqual(put.call_args[0], (self.url,))
+        self.stub.add_asset.assert_not_called()
+
+    @mock.patch.object(client.requests, 'put')
+    async def test_add_asset_over_grpc_from_a_file_pointer(self, put):
+        self.assertEqual(await self.cli.add_asset(io.BytesIO(b'content'), filename='a.txt'), 'grpc-id')
+
+        self.stub.prepare_upload.assert_not_called()
+        put.assert_not_called()
+
+    @mock.patch.object(client.requests, 'get')
+    async def test_download_asset(self, get):
+        get.return_value.iter_content.return_value = [b'con', b'tent']
+        fp = io.BytesIO()
+
+        self.assertEqual(await self.cli.download_asset(IDS[0], fp), (True, {'url': self.url, 'size': 7}))
+        self.assertEqual(fp.getvalue(), b'content')
+
+    @mock.patch.object(client.requests, 'get')
+    async def test_download_asset_with_request_error(self, get):
+        get.side_effect = client.requests.exceptions.ConnectTimeout('timeout')
+
+        with self.assertLogs(aio_client.logger):
+            result = await self.cli.download_asset(IDS[0], io.BytesIO())
+
+        self.assertEqual(result, (False, {'error_message': 'timeout'}))
+
+
+class AsyncNotFoundTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.stub = mock.Mock(spec=['update_asset', 'remove_asset'])
+        self.stub.update_asset = mock.AsyncMock()
+        self.stub.remove_asset = mock.AsyncMock()
+
+        self.cli = aio_client.AsyncClient(pool_size=1)
+        self.addAsyncCleanup(self.cli.close)
+        self.cli._stub_asset = lambda: self.stub
+        self.cli.stubBucket = mock.Mock(spec=['remove_bucket'])
+        self.cli.stubBucket.remove_bucket = mock.AsyncMock()
+
+    def calls(self):
+        return (
+            (self.stub.update_asset, lambda: self.cli.update_asset(IDS[0], filetype='xml')),
+            (self.stub.remove_asset, lambda: self.cli.remove_asset(IDS[0])),
+            (self.cli.stubBucket.remove_bucket, lambda: self.cli.remove_bucket('bucket')),
+        )
+
+    async def test_not_found_returns_none(self):
+        for rpc, call in self.calls():
+            rpc.side_effect = helpers.FakeRpcError(client.grpc.StatusCode.NOT_FOUND)
+
+            with self.assertLogs(aio_client.logger, 'ERROR'):
+                self.assertIsNone(await call())
+
+    async def test_other_errors_are_raised(self):
+        for rpc, call in self.calls():
+            rpc.side_effect = helpers.FakeRpcError(client.grpc.StatusCode.UNAVAILABLE)
+
+            with self.assertRaises(client.grpc.RpcError) as ctx:
+                await call()
+
+            self.assertEqual(ctx.exception.code(), client.grpc.StatusCode.UNAVAILABLE)
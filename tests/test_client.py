@@ -0,0 +1,431 @@
+# coding: utf-8
+import io
+import os
+import json
+import sys
+import shutil
+import tempfile
+import datetime
+import unittest
+import subprocess
+from unittest import mock
+
+from tests import helpers
+
+
+client = helpers.load_client()
+
+class UpdatePbClassTest(unittest.TestCase):
+
+    def tearDown(self):
+        helpers.generate_pb_files()
+
+    def test_update_pb_class_before_the_import(self):
+        imported = []
+
+        def generate_pb_files(host, port, proto_path):
+            imported.append(client.opac_pb2 is not None)
+            return True
+
+        with mock.patch.object(client, 'opac_pb2', None), \
+                mock.patch.object(client.utils, 'generate_pb_files', side_effect=generate_pb_files), \
+                self.assertNoLogs(client.logger, 'WARNING'):
+            client.Client(proto_http_port='8100', update_pb_class=True)
+
+        self.assertEqual(imported, [False])
+
+    def test_proto_file_changed_after_the_import(self):
+        proto = helpers.proto_with_import()
+        asset_class = client._Asset
+
+        def generate_pb_files(host, port, proto_path):
+            helpers.generate_pb_files(proto)
+            return True
+
+        with mock.patch.object(client.utils, 'generate_pb_files', side_effect=generate_pb_files), \
+                self.assertLogs(client.logger, 'WARNING') as logs:
+            client.Client(proto_http_port='8101', update_pb_class=True)
+
+        self.assertIn('restart the process', logs.output[0])
+        self.assertIn(('localhost', '8101', client.PROTO_PATH), client._updated_proto_files)
+        self.assertIs(client._Asset, asset_class)
+        self.assertFalse(hasattr(client.opac_pb2, 'AssetDates'))
+
+    def test_proto_file_with_import_on_the_first_import(self):
+        # The pb classes are imported once per process, so in a new one.
+        script = (
+            'from tests import helpers\n'
+            'client = helpers.load_client(helpers.proto_with_import())\n'
+            'print(client.opac_pb2.AssetDates(created_at={"seconds": 1}).created_at.seconds)\n')
+
+        output = subprocess.check_output([sys.executable, '-c', script], cwd=helpers.ROOT_PATH)
+
+        self.assertEqual(output.strip(), b'1')
+
+
+class UpdatePbFilesTest(unittest.TestCase):
+
+    def test_failed_update_is_tried_again(self):
+        with mock.patch.object(client.utils, 'generate_pb_files', side_effect=IOError):
+            with self.assertRaises(IOError):
+                client.Client(proto_http_port='8102', update_pb_class=True)
+
+        self.assertNotIn(('localhost', '8102', client.PROTO_PATH), client._updated_proto_files)
+
+        with mock.patch.object(client.utils, 'generate_pb_files', return_value=False) as generate:
+            client.Client(proto_http_port='8102', update_pb_class=True)
+            client.Client(proto_http_port='8102', update_pb_class=True)
+
+        generate.assert_called_once_with('localhost', '8102', client.PROTO_PATH)
+
+
+class QueryResultTest(unittest.TestCase):
+
+    def test_query_result_returns_a_dict_by_asset(self):
+        assets = [client._Asset(uuid='1', filename='a.txt'), client._Asset(uuid='2', filename='b.txt')]
+
+        result = client._query_result(assets)
+
+        self.assertEqual([(a['uuid'], a['filename']) for a in result], [('1', 'a.txt'), ('2', 'b.txt')])
+        self.assertIsNot(result[0], result[1])
+
+
+class DumpMetadataTest(unittest.TestCase):
+
+    def test_dump_metadata(self):
+        self.assertEqual(client._dump_metadata({'a': 1, 'ç': 'é'}), json.dumps({'a': 1, 'ç': 'é'}))
+
+    def test_dump_metadata_keeps_strings(self):
+        self.assertEqual(client._dump_metadata('{"a":1}'), '{"a":1}')
+
+    def test_dump_empty_metadata(self):
+        self.assertEqual(client._dump_metadata(None), client.EMPTY_METADATA)
+        self.assertEqual(client._dump_metadata({}), client.EMPTY_METADATA)
+
+    def test_dump_metadata_not_serializable(self):
+        with self.assertRaises(TypeError):
+            client._dump_metadata({'date': datetime.datetime.now()})
+
+
+class RequestParamsTest(unittest.TestCase):
+
+    def test_invalid_params_raise_without_logging(self):
+        calls = (
+            (client._add_asset_request, (io.BytesIO(b''), '', '', None, 'bucket')),
+            (client._add_asset_request, (io.BytesIO(b''), 'a.txt', '', ['metadata'], 'bucket')),
+            (client._update_asset_request, ('uuid', None, None, None, ['metadata'], None)),
+            (client._query_request, (['filters'], None)),
+        )
+
+        for func, args in calls:
+            with self.assertNoLogs(client.logger), self.assertRaises(ValueError):
+                func(*args)
+
+
+class UUIDTest(unittest.TestCase):
+
+    def test_valid_uuids(self):
+        for _id in ('3fcc9270-1740-44a3-86ad-8b0a1b7b9774',
+                    '3FCC9270-1740-44A3-86AD-8B0A1B7B9774',
+                    '3fcc9270174044a386ad8b0a1b7b9774'):
+            self.assertTrue(client._UUID_RE.fullmatch(_id), _id)
+
+    def test_invalid_uuids(self):
+        for _id in ('-' * 32,
+                    '3fcc9270-1740-44a3-86ad-8b0a1b7b9774\n',
+                    '3fcc9270-174044a3-86ad-8b0a1b7b9774',
+                    '3fcc92701-740-44a3-86ad-8b0a1b7b9774',
+                    '3fcc9270-1740-44a3-86ad-8b0a1b7b977g',
+                    '3fcc9270-1740-44a3-86ad-8b0a1b7b97741'):
+            self.assertIsNone(client._UUID_RE.fullmatch(_id), _id)
+
+    def test_get_asset_with_invalid_uuid(self):
+        cli = client.Client()
+
+        with self.assertRaises(ValueError):
+            cli.get_asset('3fcc9270-1740-44a3-86ad-8b0a1b7b9774\n')
+
+
+class AssetViewTest(unittest.TestCase):
+
+    def setUp(self):
+        self.asset = client._Asset(file=b'content', filename='a.txt', type='txt', metadata='{"a": 1}',
+                                   uuid='3fcc9270-1740-44a3-86ad-8b0a1b7b9774', bucket='bucket',
+                                   checksum='9a0364b9e99bb480dd25e1f0284c8555')
+        self.view = client.AssetView(self.asset)
+
+    def test_equals_the_dict_of_the_asset(self):
+        self.assertEqual(self.view, {'file': self.asset.file,
+                                     'filename': self.asset.filename,
+                                     'type': self.asset.type,
+                                     'metadata': self.asset.metadata,
+                                     'uuid': self.asset.uuid,
+                                     'bucket': self.asset.bucket,
+                                     'checksum': self.asset.checksum})
+
+    def test_to_dict(self):
+        result = self.view.to_dict()
+
+        self.assertIs(type(result), dict)
+        self.assertEqual(result, dict(self.view))
+        self.assertEqual(result['file'], b'content')
+
+    def test_values_are_read_once(self):
+        self.assertIs(self.view['file'], self.view['file'])
+        self.assertIs(self.view.to_dict()['file'], self.view['file'])
+        self.assertIs(list(self.view.values())[0], self.view['file'])
+
+    def test_unknown_key(self):
+        with self.assertRaises(KeyError):
+            self.view['created_at']
+
+        self.assertNotIn('created_at', self.view)
+        self.assertIsNone(self.view.get('created_at'))
+
+
+class CompressionTest(unittest.TestCase):
+
+    def test_text_formats_are_compressed(self):
+        for filename in ('a.xml', 'a.json', 'a.html', 'a.txt', 'a.js', 'a.svg'):
+            self.assertEqual(client._compression(filename), client.grpc.Compression.Gzip, filename)
+
+    def test_other_formats_are_not_compressed(self):
+        for filename in ('a.pdf', 'a.jpg', 'a.png', 'a.zip', 'a.xml.gz', 'a', ''):
+            self.assertIsNone(client._compression(filename), filename)
+
+
+class FakeFuture(object):
+
+    def __init__(self, asset):
+        self.asset = asset
+        self.cancelled = False
+
+    def result(self):
+        return self.asset
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class FakeAssetStub(object):
+
+    def __init__(self):
+        self.futures = []
+        self.get_asset = mock.Mock()
+        self.get_asset.future.side_effect = self.future
+
+    def future(self, task_id):
+        self.futures.append(FakeFuture(client._Asset(uuid=task_id.id)))
+        return self.futures[-1]
+
+
+class GetAssetBulkTest(unittest.TestCase):
+
+    ids = ['%08d-0000-0000-0000-000000000000' % n for n in range(5)]
+
+    def setUp(self):
+        self.stub = FakeAssetStub()
+        self.cli = client.Client()
+        self.cli._stub_asset = lambda: self.stub
+
+    def test_keeps_the_order_of_ids(self):
+        results = list(self.cli.get_asset_bulk(reversed(self.ids)))
+
+        self.assertEqual([asset['uuid'] for success, asset in results], self.ids[::-1])
+
+    def test_concurrency(self):
+        results = self.cli.get_asset_bulk(self.ids, concurrency=2)
+
+        next(results)
+
+        self.assertEqual(len(self.stub.futures), 2)
+
+    def test_invalid_concurrency(self):
+        for concurrency in (0, -1):
+            with self.assertRaises(ValueError):
+                next(self.cli.get_asset_bulk(self.ids, concurrency=concurrency))
+
+        self.assertEqual(self.stub.futures, [])
+
+    def test_close_cancels_the_pending_requests(self):
+        results = self.cli.get_asset_bulk(self.ids, concurrency=3)
+
+        next(results)
+        results.close()
+
+        self.assertEqual([f.cancelled for f in self.stub.futures], [False, True, True])
+
+    def test_invalid_id_cancels_the_pending_requests(self):
+        with self.assertRaises(ValueError):
+            list(self.cli.get_asset_bulk(self.ids[:2] + ['invalid']))
+
+        self.assertEqual([f.cancelled for f in self.stub.futures], [True, True])
+
+
+def http_response(chunks=(), error=None):
+    """
+    Return a response of requests with the content ``chunks``, failing with
+    ``error`` after them when given.
+    """
+    def iter_content(chunk_size):
+        for chunk in chunks:
+            yield chunk
+        if error is not None:
+            raise error
+
+    resp = mock.Mock()
+    resp.iter_content.side_effect = iter_content
+    return resp
+
+
+class HttpTest(unittest.TestCase):
+
+    url = 'http://ssm/media/a.txt'
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+
+        self.stub = mock.Mock(spec=['prepare_upload', 'add_asset'])
+        self.stub.prepare_upload.return_value = mock.Mock(url=self.url, headers={'X-Token': 't'}, asset_id='id')
+        self.stub.add_asset.return_value = client._TaskId(id='grpc-id')
+
+        self.cli = client.Client()
+        self.cli._stub_asset = lambda: self.stub
+        self.cli.get_asset_info = mock.Mock(return_value=(True, {'url': self.url, 'url_path': '/media/a.txt'}))
+
+        for name, value in (('HTTP_UPLOAD_THRESHOLD', 4), ('HTTP_TIMEOUT', 5)):
+            patcher = mock.patch.object(client, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def write_file(self, content):
+        pfile = os.path.join(self.path, 'a.txt')
+        with open(pfile, 'wb') as fp:
+            fp.write(content)
+        return pfile
+
+    @mock.patch.object(client.requests, 'put')
+    def test_add_asset_over_http_above_the_threshold(self, put):
+        self.assertEqual(self.cli.add_asset(self.write_file(b'content')), 'id')
+
+        self.assertEqual(self.stub.prepare_upload.call_args[0][0].filename, 'a.txt')
+        self.assertEqual(put.call_args[0], (self.url,))
+        self.assertEqual(put.call_args[1]['headers'], {'X-Token': 't'})
+        self.assertEqual(put.call_args[1]['timeout'], 5)
+        put.return_value.raise_for_status.assert_called_once_with()
+        self.stub.add_asset.assert_not_called()
+
+    @mock.patch.object(client.requests, 'put')
+    def test_add_asset_over_grpc_below_the_threshold(self, put):
+        self.assertEqual(self.cli.add_asset(self.write_file(b'con')), 'grpc-id')
+
+        self.assertEqual(self.stub.add_asset.call_args[0][0].file, b'con')
+        self.stub.prepare_upload.assert_not_called()
+        put.assert_not_called()
+
+    @mock.patch.object(client.requests, 'put')
+    def test_add_asset_over_grpc_from_a_file_pointer(self, put):
+        self.assertEqual(self.cli.add_asset(io.BytesIO(b'content'), filename='a.txt'), 'grpc-id')
+
+        self.stub.prepare_upload.assert_not_called()
+        put.assert_not_called()
+
+    @mock.patch.object(client.requests, 'get')
+    def test_download_asset_to_a_path(self, get):
+        get.return_value = http_response([b'con', b'tent'])
+        pfile = os.path.join(self.path, 'b.txt')
+
+        result = self.cli.download_asset('3fcc9270-1740-44a3-86ad-8b0a1b7b9774', pfile)
+
+        self.assertEqual(result, (True, {'url': self.url, 'size': 7}))
+        self.assertEqual(get.call_args[1], {'stream': True, 'timeout': 5})
+        get.return_value.close.assert_called_once_with()
+
+        with open(pfile, 'rb') as fp:
+            self.assertEqual(fp.read(), b'content')
+
+    @mock.patch.object(client.requests, 'get')
+    def test_download_asset_to_a_file_pointer(self, get):
+        get.return_value = http_response([b'con', b'tent'])
+        fp = io.BytesIO()
+
+        result = self.cli.download_asset('3fcc9270-1740-44a3-86ad-8b0a1b7b9774', fp)
+
+        self.assertEqual(result, (True, {'url': self.url, 'size': 7}))
+        self.assertEqual(fp.getvalue(), b'content')
+        self.assertFalse(fp.closed)
+
+    @mock.patch.object(client.requests, 'get')
+    def test_download_asset_with_request_error(self, get):
+        get.return_value = http_response([b'con'], client.requests.exceptions.ConnectionError('reset'))
+        pfile = os.path.join(self.path, 'b.txt')
+
+        with self.assertLogs(client.logger):
+            result = self.cli.download_asset('3fcc9270-1740-44a3-86ad-8b0a1b7b9774', pfile)
+
+        self.assertEqual(result, (False, {'error_message': 'reset'}))
+        self.assertFalse(os.path.exists(pfile))
+        get.return_value.close.assert_called_once_with()
+
+    @mock.patch.object(client.requests, 'get')
+    def test_download_asset_with_http_error(self, get):
+        get.return_value = http_response()
+        get.return_value.raise_for_status.side_effect = client.requests.exceptions.HTTPError('404 Not Found')
+        pfile = os.path.join(self.path, 'b.txt')
+
+        with self.assertLogs(client.logger):
+            result = self.cli.download_asset('3fcc9270-1740-44a3-86ad-8b0a1b7b9774', pfile)
+
+        self.assertEqual(result, (False, {'error_message': '404 Not Found'}))
+        self.assertFalse(os.path.exists(pfile))
+
+    def test_download_asset_without_asset(self):
+        self.cli.get_asset_info.return_value = (False, {'error_message': 'not found'})
+
+        self.assertEqual(self.cli.download_asset('3fcc9270-1740-44a3-86ad-8b0a1b7b9774', self.path),
+                         (False, {'error_message': 'not found'}))
+
+
+UUID = '3fcc9270-1740-44a3-86ad-8b0a1b7b9774'
+
+
+class NotFoundTest(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = mock.Mock(spec=['update_asset', 'remove_asset'])
+        self.cli = client.Client()
+        self.cli._stub_asset = lambda: self.stub
+        self.cli.stubBucket = mock.Mock(spec=['remove_bucket'])
+
+    def calls(self):
+        return (
+            (self.stub.update_asset, lambda: self.cli.update_asset(UUID, filetype='xml')),
+            (self.stub.remove_asset, lambda: self.cli.remove_asset(UUID)),
+            (self.cli.stubBucket.remove_bucket, lambda: self.cli.remove_bucket('bucket')),
+        )
+
+    def test_not_found_returns_none(self):
+        for rpc, call in self.calls():
+            rpc.side_effect = helpers.FakeRpcError(client.grpc.StatusCode.NOT_FOUND)
+
+            with self.assertLogs(client.logger, 'ERROR'):
+                self.assertIsNone(call())
+
+    def test_other_errors_are_raised(self):
+        for rpc, call in self.calls():
+            rpc.side_effect = helpers.FakeRpcError(client.grpc.StatusCode.UNAVAILABLE)
+
+            with self.assertRaises(client.grpc.RpcError) as ctx:
+                call()
+
+            self.assertEqual(ctx.exception.code(), client.grpc.StatusCode.UNAVAILABLE)
+
+    def test_found(self):
+        self.stub.update_asset.return_value = client._TaskId(id=UUID)
+        self.stub.remove_asset.return_value = 'removed'
+        self.cli.stubBucket.remove_bucket.return_value = 'removed'
+
+        self.assertEqual(self.cli.update_asset(UUID, filetype='xml'), UUID)
+        self.assertEqual(self.cli.remove_asset(UUID), 'removed')
+        self.assertEqual(self.cli.remove_bucket('bucket'), 'removed')
@@ -0,0 +1,130 @@
+# coding: utf-8
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from opac_ssm_api import utils
+
+
+PROTO = 'syntax = "proto3";\nmessage TaskId { string id = 1; }\n'
+
+
+def response(status_code, text='', headers=None):
+    return mock.Mock(status_code=status_code, text=text, headers=headers or {})
+
+
+class ProtoFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+
+        for name, value in (('PATH_PB_FILES', self.path),
+                            ('PROTO_FILE', '{0}/opac.proto'.format(self.path)),
+                            ('PROTO_VALIDATORS_FILE', '{0}/opac.proto.validators'.format(self.path))):
+            patcher = mock.patch.object(utils, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        patcher = mock.patch.object(utils.requests, 'get')
+        self.get = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def save_proto_file(self, validators):
+        with open(utils.PROTO_FILE, 'w') as fp:
+            fp.write(PROTO)
+
+        with open(utils.PROTO_VALIDATORS_FILE, 'w') as fp:
+            json.dump(validators, fp)
+
+    def test_get_proto_file_saves_the_file_and_the_validators(self):
+        self.get.return_value = response(200, PROTO, {'ETag': '"v1"', 'Last-Modified': 'Mon, 01 Jan 2018 00:00:00 GMT'})
+
+        self.assertTrue(utils.get_proto_file())
+
+        self.assertEqual(self.get.call_args[1]['headers'], {})
+
+        with open(utils.PROTO_FILE) as fp:
+            self.assertEqual(fp.read(), PROTO)
+
+        self.assertEqual(utils._read_validators(),
+                         {'etag': '"v1"', 'last_modified': 'Mon, 01 Jan 2018 00:00:00 GMT'})
+
+    def test_get_proto_file_sends_the_validators(self):
+        self.save_proto_file({'etag': '"v1"', 'last_modified': 'Mon, 01 Jan 2018 00:00:00 GMT'})
+        self.get.return_value = response(304)
+
+        self.assertFalse(utils.get_proto_file())
+
+        self.assertEqual(self.get.call_args[1]['headers'],
+                         {'If-None-Match': '"v1"', 'If-Modified-Since': 'Mon, 01 Jan 2018 00:00:00 GMT'})
+
+    def test_get_proto_file_without_proto_file_ignores_the_validators(self):
+        with open(utils.PROTO_VALIDATORS_FILE, 'w') as fp:
+            json.dump({'etag': '"v1"'}, fp)
+        self.get.return_value = response(200, PROTO)
+
+        self.assertTrue(utils.get_proto_file())
+
+        self.assertEqual(self.get.call_args[1]['headers'], {})
+
+    def test_get_proto_file_with_the_same_content(self):
+        self.save_proto_file({})
+        self.get.return_value = response(200, PROTO, {'ETag': '"v2"'})
+
+        self.assertFalse(utils.get_proto_file())
+
+        self.assertEqual(utils._read_validators()['etag'], '"v2"')
+
+    def test_get_proto_file_with_unexpected_status_code(self):
+        self.get.return_value = response(500)
+
+        self.assertFalse(utils.get_proto_file())
+
+        self.assertFalse(os.path.isfile(utils.PROTO_FILE))
+
+    def test_get_proto_file_with_connection_error(self):
+        self.get.side_effect = utils.requests.exceptions.ConnectionError
+
+        with self.assertRaises(utils.requests.exceptions.ConnectionError):
+            utils.get_proto_file()
+
+    def test_generate_pb_files(self):
+        self.get.return_value = response(200, PROTO)
+
+        self.assertTrue(utils.generate_pb_files())
+
+        self.assertTrue(os.path.isfile('{0}/opac_pb2_grpc.py'.format(self.path)))
+
+    def test_generate_pb_files_with_unchanged_proto_file(self):
+        self.get.return_value = response(200, PROTO)
+        utils.generate_pb_files()
+        self.get.return_value = response(304)
+
+        with mock.patch('grpc.tools.protoc.main') as main:
+            self.assertFalse(utils.generate_pb_files())
+
+        main.assert_not_called()
+
+    def test_generate_pb_files_with_a_missing_pb_file(self):
+        self.get.return_value = response(200, PROTO)
+        utils.generate_pb_files()
+        os.remove('{0}/opac_pb2.py'.format(self.path))
+        self.get.return_value = response(304)
+
+        self.assertTrue(utils.generate_pb_files())
+
+        self.assertTrue(os.path.isfile('{0}/opac_pb2.py'.format(self.path)))
+
+    def test_generate_pb_files_with_force(self):
+        self.get.return_value = response(200, PROTO)
+        utils.generate_pb_files()
+        self.get.return_value = response(304)
+
+        with mock.patch('grpc.tools.protoc.main') as main:
+            self.assertTrue(utils.generate_pb_files(force=True))
+
+        main.assert_called_once()